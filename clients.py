@@ -1,17 +1,53 @@
 import os
+import time
+import logging
 import base64
+import functools
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 
+import aiohttp
 import boto3
-from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.conditions import Key, Attr
+from boto3.dynamodb.types import TypeDeserializer
 from botocore.config import Config
 import streamlit as st
 from gql import gql, Client
 from gql.transport.aiohttp import AIOHTTPTransport
+from geopy.geocoders import Nominatim
 
+from stores import InvoiceStore, TrackingStore
+
+
+logger = logging.getLogger(__name__)
 
 WAVE_TOKEN = st.secrets['wave']['WAVE_TOKEN']
 WAVE_URL = "https://gql.waveapps.com/graphql/public"
 WAVE_BUSINESS_ID = st.secrets['wave']["WAVE_BUSINESS_ID"]
+WAVE_MAX_CONNECTIONS = 10
+WAVE_KEEPALIVE_TIMEOUT = 60
+# Wave has no tombstones for deleted invoices, so the local copy is rebuilt from scratch this often
+WAVE_FULL_SYNC_INTERVAL = timedelta(hours=24)
+# Re-read a little before the watermark so invoices sharing its timestamp are not missed
+WAVE_SYNC_OVERLAP = timedelta(minutes=5)
+
+TRACKING_TABLE = 'donation-tracking'
+# BatchGetItem accepts at most 100 keys per call
+TRACKING_BATCH_SIZE = 100
+TRACKING_WORKERS = 8
+TRACKING_BATCH_RETRIES = 5
+# The only attributes the pages use; column syncs merge on donation_id
+TRACKING_COLUMNS = ('donation_id', 'referrer')
+# Full re-read of the tracking partition this often, to pick up items written out of id order
+TRACKING_FULL_SYNC_INTERVAL = timedelta(hours=24)
+# Re-read this far back from the watermark so items written slightly out of id order are not missed
+TRACKING_SYNC_OVERLAP = timedelta(minutes=5)
+# Donation ids are Wave invoice ids: 19-digit snowflake-style ids with a millisecond timestamp above
+# this many low bits, so a span of time maps to a span of ids. Were the ids denser than that, the
+# margin would only cover more ids (re-read more), never fewer
+TRACKING_ID_TIMESTAMP_SHIFT = 22
 
 
 def decode_invoice_id(value):
@@ -26,130 +62,401 @@ def decode_invoice_id(value):
 
     return business_id, invoice_id
 
-INVOICES_QUERY = gql("""query($businessId: ID!, $page: Int!, $slug: String!) {
-  business(id: $businessId) {
+def _tracking_sync_after(watermark):
+    # Donation ids are numeric strings compared as strings by DynamoDB, so keep the width:
+    # a zero-padded smaller number sorts below the watermark
+    if watermark is None or not watermark.isdigit():
+        return watermark
+
+    overlap = (TRACKING_SYNC_OVERLAP // timedelta(milliseconds=1)) << TRACKING_ID_TIMESTAMP_SHIFT
+
+    return str(max(int(watermark) - overlap, 0)).zfill(len(watermark))
+
+def _parse_timestamp(value):
+    # Wave returns "2023-01-31T10:00:00.000Z"; fromisoformat() only accepts "Z" from Python 3.11
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+async def _next_page(pages):
+    # Drives an async page generator from another thread; None marks the end
+    try:
+        return await pages.__anext__()
+    except StopAsyncIteration:
+        return None
+
+# Selection blocks combined into the named projections below
+INVOICE_FIELD_SETS = {
+    'summary': """  id
+  invoiceNumber
+  status
+  lastSentAt
+  lastSentVia
+  createdAt
+  modifiedAt
+  amountDue {
+    raw
+    value
+  }
+  amountPaid {
+    raw
+    value
+  }
+  total {
+    raw
+    value
+  }""",
+    'details': """  title
+  subhead
+  footer
+  memo""",
+    'customer': """  customer {
     id
-    invoices(
-      page: $page,
-      invoiceNumber: $slug
-    ) {
-      edges {
-        node {
-          id
-          title
-          subhead
-          invoiceNumber
-          footer
-          memo
-          status
-          lastSentAt
-          lastSentVia
-          createdAt
-          amountDue {
-            raw
-            value
-          }
-          amountPaid {
-            raw
-            value
-          }
-          total {
-            raw
-            value
-          }
-          customer {
-            id
+    name
+    email
+    address {
+        addressLine1
+        addressLine2
+        city
+        province {
+            code
             name
-            email
-            address {
-                addressLine1
-                addressLine2
-                city
-                province {
-                    code
-                    name
-                }
-                country {
-                    code
-                    name
-                }
-                postalCode
-            }
-            shippingDetails {
+        }
+        country {
+            code
+            name
+        }
+        postalCode
+    }
+    shippingDetails {
+        name
+        phone
+        address {
+            addressLine1
+            addressLine2
+            city
+            province {
+                code
                 name
-                phone
-                address {
-                    addressLine1
-                    addressLine2
-                    city
-                    province {
-                        code
-                        name
-                    }
-                    country {
-                        code
-                        name
-                    }
-                    postalCode
-                }
             }
-          }
-          items {
-            description
-            quantity
-            unitPrice
-            product {
-              id
-              name
+            country {
+                code
+                name
             }
-          }
+            postalCode
         }
-      }
-      pageInfo {
-        totalPages
-        currentPage
-        totalCount
-      }
+    }
+  }""",
+    'items': """  items {
+    description
+    quantity
+    unitPrice
+    product {
+      id
+      name
+    }
+  }""",
+}
+
+# What each dashboard view needs: "metrics" is enough for the headline numbers and
+# charts, "donors" adds memo and customer details, "items" adds the line items.
+INVOICE_PROJECTIONS = {
+    'metrics': ('summary',),
+    'donors': ('summary', 'details', 'customer'),
+    'items': ('summary', 'items'),
+    'full': ('summary', 'details', 'customer', 'items'),
+}
+
+
+@functools.lru_cache()
+def invoice_fields(projection='full'):
+    fields = '\n'.join(INVOICE_FIELD_SETS[field_set] for field_set in INVOICE_PROJECTIONS[projection])
+
+    return """fragment InvoiceFields on Invoice {
+""" + fields + """
+}
+
+fragment InvoicePage on InvoiceConnection {
+  edges {
+    node {
+      ...InvoiceFields
+    }
+  }
+  pageInfo {
+    totalPages
+    currentPage
+    totalCount
+  }
+}"""
+
+
+@functools.lru_cache()
+def invoices_query(projection='full'):
+    return gql("""query($businessId: ID!, $page: Int!, $slug: String!, $modifiedAtAfter: DateTime) {
+  business(id: $businessId) {
+    id
+    invoices(
+      page: $page,
+      invoiceNumber: $slug,
+      modifiedAtAfter: $modifiedAtAfter
+    ) {
+      ...InvoicePage
     }
   }
-}""")
+}
+
+""" + invoice_fields(projection))
+
+
+INVOICES_QUERY = invoices_query('full')
+
+
+@functools.lru_cache()
+def invoices_batch_query(count: int, projection='full'):
+    """
+    Query document fetching one invoices page for each of `count` slugs in a single
+    request, as aliases `invoices0` ... `invoices{count - 1}`.
+    """
+    variables = ', '.join(f"$page{i}: Int!, $slug{i}: String!" for i in range(count))
+    aliases = '\n'.join(
+        f"""    invoices{i}: invoices(page: $page{i}, invoiceNumber: $slug{i}, modifiedAtAfter: $modifiedAtAfter) {{
+      ...InvoicePage
+    }}"""
+        for i in range(count)
+    )
+
+    return gql(f"""query($businessId: ID!, {variables}, $modifiedAtAfter: DateTime) {{
+  business(id: $businessId) {{
+    id
+{aliases}
+  }}
+}}
+
+""" + invoice_fields(projection))
 
 class WaveClient:
     """
     Client for Wave GraphQL API.
 
     API Playgound - https://developer.waveapps.com/hc/en-us/articles/360018937431-API-Playground
+
+    The client keeps one aiohttp session with a keep-alive connection pool open on
+    its own event loop thread, so every request after the first reuses a warm TLS
+    connection. Sync methods block on that loop, async ones await it from any loop.
     """
 
-    def __init__(self, business_id=WAVE_BUSINESS_ID):
+    def __init__(self, business_id=WAVE_BUSINESS_ID, concurrency=1, store=None):
         self.business_id = business_id
-        headers = {"Authorization": f"Bearer {WAVE_TOKEN}"}
-        transport = AIOHTTPTransport(url=WAVE_URL, headers=headers)
-        self.client = Client(transport=transport)
-    
-    def get_invoices_for_slug(self, slug: str):
+        self.concurrency = concurrency
+        self.store = store or InvoiceStore()
+
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, name='wave-client', daemon=True).start()
+        self.client, self.session = self._run(self._connect())
+
+    async def _connect(self):
+        # aiohttp wants the connector created on the loop it will be used from
+        connector = aiohttp.TCPConnector(limit=WAVE_MAX_CONNECTIONS, keepalive_timeout=WAVE_KEEPALIVE_TIMEOUT)
+        transport = AIOHTTPTransport(
+            url=WAVE_URL,
+            headers={"Authorization": f"Bearer {WAVE_TOKEN}"},
+            client_session_args={'connector': connector},
+        )
+        client = Client(transport=transport)
+        session = await client.connect_async()
+
+        return client, session
+
+    def _run(self, coro):
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result()
+
+    def close(self):
+        self._run(self.client.close_async())
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+    def _invoices_variables(self, slug: str, page: int, modified_after=None):
+        return {
+            'businessId': self.business_id,
+            'page': page,
+            'slug': slug.upper(),
+            'modifiedAtAfter': modified_after,
+        }
+
+    def get_invoices_for_slug(self, slug: str, concurrency=None, modified_after=None, projection='full'):
+        """
+        Fetch all invoices for the campaign slug.
+
+        With `concurrency` above 1 page 1 is fetched first to learn `totalPages`,
+        then the remaining pages are requested in parallel, at most `concurrency`
+        at a time. Invoices are returned in page order either way.
+
+        `modified_after` (ISO timestamp) limits the result to invoices changed since then.
+        `projection` picks one of INVOICE_PROJECTIONS to only download the fields a view needs.
+        """
+        return self._run(self._get_invoices_for_slug(slug, concurrency, modified_after, projection))
+
+    async def aget_invoices_for_slug(self, slug: str, concurrency=None, modified_after=None, projection='full'):
+        """
+        Async version of `get_invoices_for_slug`, usable from any event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._get_invoices_for_slug(slug, concurrency, modified_after, projection), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def _get_invoices_for_slug(self, slug: str, concurrency=None, modified_after=None, projection='full'):
         invoices = []
+        async for edges in self._iter_invoice_pages(slug, concurrency, modified_after, projection):
+            invoices.extend(edges)
+
+        return invoices
+
+    def iter_invoice_pages(self, slug: str, concurrency=None, modified_after=None, projection='full'):
+        """
+        Yield the invoices of each page for the slug as soon as that page arrives.
+
+        Pages are yielded in order; with `concurrency` above 1 the later pages are
+        already being downloaded while the caller works on the current one.
+        """
+        pages = self._iter_invoice_pages(slug, concurrency, modified_after, projection)
+        try:
+            while True:
+                edges = self._run(_next_page(pages))
+                if edges is None:
+                    return
+                yield edges
+        finally:
+            self._run(pages.aclose())
+
+    async def _iter_invoice_pages(self, slug: str, concurrency=None, modified_after=None, projection='full'):
+        concurrency = concurrency or self.concurrency
+        query = invoices_query(projection)
+
+        first = await self.session.execute(query, variable_values=self._invoices_variables(slug, 1, modified_after))
+        yield first['business']['invoices']['edges']
+
+        total_pages = first['business']['invoices']['pageInfo']['totalPages']
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def fetch_page(page):
+            async with semaphore:
+                return await self.session.execute(query, variable_values=self._invoices_variables(slug, page, modified_after))
+
+        tasks = [asyncio.ensure_future(fetch_page(page)) for page in range(2, total_pages + 1)]
+        try:
+            # Awaiting in page order keeps the output order regardless of completion order
+            for task in tasks:
+                response = await task
+                yield response['business']['invoices']['edges']
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def get_invoices_for_slugs(self, slugs, modified_after=None, projection='full'):
+        """
+        Fetch all invoices for several campaign slugs at once.
+
+        Page N of every slug that still has pages left goes out as one aliased
+        query, so a cross-campaign refresh costs one round trip per page depth.
+        Returns a dict of slug to invoices, in the same order as `get_invoices_for_slug`.
+        """
+        return self._run(self._get_invoices_for_slugs(slugs, modified_after, projection))
+
+    async def aget_invoices_for_slugs(self, slugs, modified_after=None, projection='full'):
+        """
+        Async version of `get_invoices_for_slugs`, usable from any event loop.
+        """
+        future = asyncio.run_coroutine_threadsafe(self._get_invoices_for_slugs(slugs, modified_after, projection), self.loop)
+        return await asyncio.wrap_future(future)
+
+    async def _get_invoices_for_slugs(self, slugs, modified_after=None, projection='full'):
+        invoices = {slug: [] for slug in slugs}
+        pending = list(invoices)
         page = 1
-        while True:
-            response = self.client.execute(INVOICES_QUERY, variable_values={
-                'businessId': self.business_id,
-                'page': page,
-                'slug': slug.upper(),
-            })
-            invoices.extend(response['business']['invoices']['edges'])
-
-            # Check for next page
-            total_pages = response['business']['invoices']['pageInfo']['totalPages']
-            if page >= total_pages:
-                break
+        while pending:
+            variables = {'businessId': self.business_id, 'modifiedAtAfter': modified_after}
+            for i, slug in enumerate(pending):
+                variables[f'page{i}'] = page
+                variables[f'slug{i}'] = slug.upper()
+
+            response = await self.session.execute(invoices_batch_query(len(pending), projection), variable_values=variables)
+
+            still_pending = []
+            for i, slug in enumerate(pending):
+                result = response['business'][f'invoices{i}']
+                invoices[slug].extend(result['edges'])
+                if page < result['pageInfo']['totalPages']:
+                    still_pending.append(slug)
+
+            pending = still_pending
             page += 1
-        
+
         return invoices
 
+    def sync_invoices_for_slug(self, slug: str, concurrency=None, on_page=None):
+        """
+        Bring the local invoice store up to date and return all invoices for the slug.
+
+        Only invoices modified since the last sync are downloaded and merged in by
+        decoded invoice id; a full download happens on first use and then every
+        WAVE_FULL_SYNC_INTERVAL to drop invoices deleted in Wave.
+
+        `on_page` is called with each page of invoices during a full download,
+        so callers can show partial results while it runs.
+        """
+        state = self.store.load(slug)
+        now = datetime.now(timezone.utc)
+
+        full_synced_at = state['full_synced_at']
+        if full_synced_at is None or now - datetime.fromisoformat(full_synced_at) > WAVE_FULL_SYNC_INTERVAL:
+            state = {'invoices': {}, 'modified_at': None, 'full_synced_at': now.isoformat()}
+            modified_after = None
+        elif state['modified_at']:
+            modified_after = (datetime.fromisoformat(state['modified_at']) - WAVE_SYNC_OVERLAP).isoformat()
+        else:
+            modified_after = None
+
+        for edges in self.iter_invoice_pages(slug, concurrency=concurrency, modified_after=modified_after):
+            if on_page and modified_after is None:
+                on_page(edges)
+
+            for invoice in edges:
+                _, invoice_id = decode_invoice_id(invoice['node']['id'])
+                state['invoices'][invoice_id] = invoice
+
+                if invoice['node']['modifiedAt']:
+                    modified_at = _parse_timestamp(invoice['node']['modifiedAt'])
+                    if state['modified_at'] is None or modified_at > datetime.fromisoformat(state['modified_at']):
+                        state['modified_at'] = modified_at.isoformat()
+
+        self.store.save(slug, state)
+
+        # Newest first, same as Wave returns them
+        return sorted(state['invoices'].values(), key=lambda inv: inv['node']['createdAt'], reverse=True)
+
+
+TYPE_DESERIALIZER = TypeDeserializer()
+
+
+def deserialize_attribute(value):
+    """
+    Plain Python value of a low-level DynamoDB attribute value.
+
+    Strings, numbers, nulls and booleans are unpacked directly, with numbers as
+    int/float rather than Decimal; anything else goes through boto3's TypeDeserializer.
+    """
+    if 'S' in value:
+        return value['S']
+    if 'N' in value:
+        number = value['N']
+        return int(number) if number.lstrip('-').isdigit() else float(number)
+    if 'NULL' in value:
+        return None
+    if 'BOOL' in value:
+        return value['BOOL']
+
+    return TYPE_DESERIALIZER.deserialize(value)
+
 
 class TrackingClient:
     
-    def __init__(self, aws_key, aws_secret, business_id=WAVE_BUSINESS_ID):
+    def __init__(self, aws_key, aws_secret, business_id=WAVE_BUSINESS_ID, store=None, columns=None):
         aws_config = Config(
             region_name = 'us-east-2',
             signature_version = 'v4',
@@ -163,16 +470,226 @@ class TrackingClient:
             aws_access_key_id=aws_key,
             aws_secret_access_key=aws_secret
         )
-        self.attribution_table = self.dynamodb.Table('donation-tracking')
+        # Plain client without the resource's (de)serialisation hooks, for projected reads
+        self.raw_client = boto3.client('dynamodb',
+            config=aws_config,
+            aws_access_key_id=aws_key,
+            aws_secret_access_key=aws_secret
+        )
         self.business_id = base64.b64decode(business_id).decode().split(':')[1]
+        # Unlike boto3 resources the low-level client is thread safe, and the resource's
+        # client still (de)serialises plain Python values
+        self.client = self.dynamodb.meta.client
+        self.store = store or TrackingStore()
+        # When set, syncs read only these attributes through the low-level client
+        self.columns = columns
 
-    def get_all(self):
-        response = self.attribution_table.query(
-            KeyConditionExpression=Key('business_id').eq(self.business_id)
-        )
-        data = response['Items']
-        while 'LastEvaluatedKey' in response:
-            response = self.attribution_table.query(ExclusiveStartKey=response['LastEvaluatedKey'])
-            data.extend(response['Items'])
+    def get_all(self, segments=1):
+        """
+        All tracking items of the business.
+
+        With `segments` above 1 the table is read as a parallel Scan of that many
+        segments on a thread pool, filtered to the business. That reads the whole
+        table, so it only pays off while the business owns most of it.
+        """
+        if segments > 1:
+            with ThreadPoolExecutor(max_workers=segments) as executor:
+                results = list(executor.map(lambda segment: self._scan_segment(segment, segments), range(segments)))
+
+            return [item for items in results for item in items]
+
+        return self._query(Key('business_id').eq(self.business_id))
+
+    def sync_all(self):
+        """
+        Bring the local tracking store up to date and return all tracking items.
+
+        Donation ids are Wave invoice ids, which grow over time, so after the first
+        full read only items with a donation id above the stored watermark are
+        queried and merged, starting TRACKING_SYNC_OVERLAP before it. A full read
+        still happens every TRACKING_FULL_SYNC_INTERVAL.
+
+        With `columns` set, the store and the result are column-oriented,
+        {column: [values]}, instead of a list of item dicts.
+        """
+        state = self.store.load(self.business_id)
+        now = datetime.now(timezone.utc)
+
+        full_synced_at = state['full_synced_at']
+        if full_synced_at is None or now - datetime.fromisoformat(full_synced_at) > TRACKING_FULL_SYNC_INTERVAL:
+            state = {'items': {}, 'last_donation_id': None, 'full_synced_at': now.isoformat()}
+
+        if self.columns:
+            return self._sync_columns(state)
+
+        after_donation_id = _tracking_sync_after(state['last_donation_id'])
+        if after_donation_id is None:
+            items = self.get_all()
+        else:
+            items = self._query(Key('business_id').eq(self.business_id) & Key('donation_id').gt(after_donation_id))
+
+        for item in items:
+            state['items'][item['donation_id']] = item
+            if state['last_donation_id'] is None or item['donation_id'] > state['last_donation_id']:
+                state['last_donation_id'] = item['donation_id']
+
+        self.store.save(self.business_id, state)
+
+        return list(state['items'].values())
+
+    def _sync_columns(self, state):
+        data = state['items']
+        if set(data) != set(self.columns):
+            # Fresh state, or a store written with other columns: read everything again
+            data = state['items'] = {column: [] for column in self.columns}
+            state['last_donation_id'] = None
+
+        new_data = self.get_columns(self.columns, after_donation_id=_tracking_sync_after(state['last_donation_id']))
+
+        # Overlapping ids replace their row in place, new ids are appended
+        positions = {donation_id: i for i, donation_id in enumerate(data['donation_id'])}
+        for i, donation_id in enumerate(new_data['donation_id']):
+            position = positions.get(donation_id)
+            if position is None:
+                positions[donation_id] = len(data['donation_id'])
+                for column, values in new_data.items():
+                    data[column].append(values[i])
+            else:
+                for column, values in new_data.items():
+                    data[column][position] = values[i]
+
+            if state['last_donation_id'] is None or donation_id > state['last_donation_id']:
+                state['last_donation_id'] = donation_id
+
+        self.store.save(self.business_id, state)
+
+        return data
+
+    def get_columns(self, columns=TRACKING_COLUMNS, after_donation_id=None):
+        """
+        Selected attributes of the business's tracking items, as {column: [values]}.
+
+        Only `columns` are read (ProjectionExpression) through the low-level client,
+        and values are unpacked by `deserialize_attribute` straight into the column
+        lists, skipping the resource layer's Decimal/TypeDeserializer work.
+        `after_donation_id` limits the read to donation ids above it.
+        """
+        names = {'#business_id': 'business_id', **{f'#c{i}': column for i, column in enumerate(columns)}}
+        values = {':business_id': {'S': self.business_id}}
+        key_condition = '#business_id = :business_id'
+        if after_donation_id is not None:
+            names['#donation_id'] = 'donation_id'
+            values[':after_donation_id'] = {'S': after_donation_id}
+            key_condition += ' AND #donation_id > :after_donation_id'
+
+        data = {column: [] for column in columns}
+        for response in self._pages(self.raw_client.query, {
+            'TableName': TRACKING_TABLE,
+            'KeyConditionExpression': key_condition,
+            'ProjectionExpression': ', '.join(f'#c{i}' for i in range(len(columns))),
+            'ExpressionAttributeNames': names,
+            'ExpressionAttributeValues': values,
+        }):
+            for item in response['Items']:
+                for column in columns:
+                    value = item.get(column)
+                    data[column].append(None if value is None else deserialize_attribute(value))
 
         return data
+
+    def get_for_donations(self, donation_ids):
+        """
+        Tracking items for the given donation (decoded invoice) ids only.
+
+        Keys are sent in BatchGetItem chunks of TRACKING_BATCH_SIZE from a thread
+        pool, and unprocessed keys are retried with backoff. Items come back in
+        no particular order, ids without tracking are simply missing.
+        """
+        donation_ids = list(dict.fromkeys(donation_ids))
+        chunks = [donation_ids[i:i + TRACKING_BATCH_SIZE] for i in range(0, len(donation_ids), TRACKING_BATCH_SIZE)]
+
+        with ThreadPoolExecutor(max_workers=TRACKING_WORKERS) as executor:
+            results = list(executor.map(self._batch_get, chunks))
+
+        return [item for items in results for item in items]
+
+    def _batch_get(self, donation_ids):
+        request = {
+            TRACKING_TABLE: {
+                'Keys': [{'business_id': self.business_id, 'donation_id': donation_id} for donation_id in donation_ids],
+            },
+        }
+        items = []
+        for attempt in range(TRACKING_BATCH_RETRIES + 1):
+            response = self.client.batch_get_item(RequestItems=request)
+            items.extend(response['Responses'].get(TRACKING_TABLE, []))
+
+            request = response.get('UnprocessedKeys')
+            if not request:
+                return items
+            time.sleep(min(0.05 * 2 ** attempt, 2))
+
+        raise RuntimeError(f"{len(request[TRACKING_TABLE]['Keys'])} tracking keys still unprocessed after {TRACKING_BATCH_RETRIES} retries")
+
+    def get_between(self, first_donation_id, last_donation_id):
+        """
+        Tracking items with donation ids from `first_donation_id` to `last_donation_id`.
+
+        This is a key condition on the sort key, so only that slice of the partition
+        is read. Wave invoice ids grow over time, so the id span of a campaign's
+        invoices also bounds a time range.
+        """
+        return self._query(Key('business_id').eq(self.business_id) & Key('donation_id').between(first_donation_id, last_donation_id))
+
+    def _query(self, key_condition):
+        return self._paginate(self.client.query, {
+            'TableName': TRACKING_TABLE,
+            'KeyConditionExpression': key_condition,
+        })
+
+    def _scan_segment(self, segment, total_segments):
+        return self._paginate(self.client.scan, {
+            'TableName': TRACKING_TABLE,
+            'FilterExpression': Attr('business_id').eq(self.business_id),
+            'Segment': segment,
+            'TotalSegments': total_segments,
+        })
+
+    def _paginate(self, operation, params):
+        return [item for response in self._pages(operation, params) for item in response['Items']]
+
+    def _pages(self, operation, params):
+        while True:
+            response = operation(**params, ReturnConsumedCapacity='TOTAL')
+            logger.info(
+                "Tracking %s returned %s items for %s capacity units",
+                operation.__name__, response['Count'], response.get('ConsumedCapacity', {}).get('CapacityUnits'),
+            )
+            yield response
+
+            if 'LastEvaluatedKey' not in response:
+                return
+            # Every page repeats the full request, only the start key changes
+            params = {**params, 'ExclusiveStartKey': response['LastEvaluatedKey']}
+
+
+# Clients are created once per process and shared by every page and session,
+# so Streamlit reruns reuse the same boto3/aiohttp connection pools.
+
+@st.cache_resource
+def get_wave_client():
+    return WaveClient()
+
+
+@st.cache_resource
+def get_tracking_client():
+    return TrackingClient(
+        aws_key=st.secrets['aws']['AWS_ACCESS_KEY_ID'],
+        aws_secret=st.secrets['aws']['AWS_SECRET_ACCESS_KEY'],
+        columns=TRACKING_COLUMNS,
+    )
+
+
+@st.cache_resource
+def get_geolocator():
+    return Nominatim(user_agent="example app")
@@ -1,16 +1,46 @@
 from urllib.parse import urlparse, parse_qs
+from concurrent.futures import ThreadPoolExecutor
 import re
+import threading
 
 import streamlit as st
+import numpy as np
 import pandas as pd
 import altair as alt
-from clients import WaveClient, TrackingClient, decode_invoice_id
-from geopy.geocoders import Nominatim
+from clients import decode_invoice_id
+from scheduler import get_refresh_scheduler
 
 
-wave = WaveClient()
-geolocator = Nominatim(user_agent="example app")
-tracking = TrackingClient(aws_key=st.secrets['aws']['AWS_ACCESS_KEY_ID'], aws_secret=st.secrets['aws']['AWS_SECRET_ACCESS_KEY'])
+# Background reads started by the page loaders
+LOADER = ThreadPoolExecutor(max_workers=4, thread_name_prefix='loader')
+
+# Compact schema: categoricals for low-cardinality columns, Arrow-backed strings for free text
+CATEGORY_COLUMNS = (
+    'status', 'last_sent_via', 'name', 'product_id',
+    'address_city', 'address_province', 'address_country',
+    'shipping_address_city', 'shipping_address_province', 'shipping_address_country',
+)
+TEXT_COLUMNS = (
+    'id', 'invoice_id', 'donation_id', 'invoice_number', 'memo', 'comment', 'company', 'description', 'referrer',
+    'customer_name', 'customer_email', 'customer_phone',
+    'address_line_1', 'address_line_2', 'address_postal_code',
+    'shipping_address_line_1', 'shipping_address_line_2', 'shipping_address_postal_code',
+)
+# NaN for missing values like the default strings, so .str.contains masks stay plain booleans
+TEXT_DTYPE = pd.StringDtype('pyarrow', na_value=np.nan)
+
+# Columns the "Search fields" box looks in
+SEARCH_COLUMNS = (
+    'customer_name', 'customer_email', 'invoice_number', 'customer_phone',
+    'address_city', 'address_province', 'address_postal_code', 'address_line_1', 'memo',
+)
+SEARCH_CACHE_SIZE = 256
+# Columns with per-value row bitmaps in the donor filters, and the selectbox value meaning "no filter"
+FILTER_COLUMNS = ('status', 'last_sent_via')
+FILTER_ALL = "ALL"
+TABLE_PAGE_SIZES = (50, 100, 500, 1000)
+
+UTM_PARAMS = ('utm_source', 'utm_medium', 'utm_campaign', 'utm_content', 'utm_term')
 
 MEMO_RE = re.compile(r"(Company name\:(?P<company>.*))?\n*(Note\:(?P<comment>.*))?")
 
@@ -35,6 +65,20 @@ def sanitize_address(raw_address):
     )
 
 
+def compact_df(df):
+    """
+    The frame with the compact schema applied to whichever of its columns are
+    in CATEGORY_COLUMNS or TEXT_COLUMNS.
+
+    Group by categorical columns with observed=True, otherwise unused categories
+    show up as empty groups.
+    """
+    dtypes = {column: 'category' for column in CATEGORY_COLUMNS if column in df}
+    dtypes.update({column: TEXT_DTYPE for column in TEXT_COLUMNS if column in df})
+
+    return df.astype(dtypes)
+
+
 def parse_memo(memo):
     match = MEMO_RE.match(memo)
     if match:
@@ -44,51 +88,118 @@ def parse_memo(memo):
 
     return memo, None
 
-def invoices_to_df(invoices):
-    data = []
+def sanitize_addresses(addresses):
+    """
+    Vectorised `sanitize_address` over a list of raw address dicts, as columns
+    (line_1, line_2, city, province, country, postal_code).
+    """
+    if not addresses:
+        return ([],) * 6
 
-    for inv in invoices:
-        shipping_details = inv['node']['customer'].get('shippingDetails') or {}
-        shipping_address = sanitize_address(shipping_details.get('address') or {})
-        address_details = sanitize_address(inv['node']['customer'].get('address') or {})
-        comment, company = parse_memo(inv['node']['memo'])
-
-        _, invoice_id = decode_invoice_id(inv['node']['id'])
-        data.append({
-            'id': invoice_id,
-            'memo': inv['node']['memo'],
-            'comment': comment,
-            'company': company,
-            'status': inv['node']['status'],
-            'invoice_number': inv['node']['invoiceNumber'],
-            'last_sent_at': inv['node']['lastSentAt'],
-            'last_sent_via': inv['node']['lastSentVia'],
-            'registered_at': inv['node']['createdAt'],
-            'createdAt': inv['node']['createdAt'],
-            'amountDue': inv['node']['amountDue']['value'],
-            'amountPaid': inv['node']['amountPaid']['value'],
-            'total': inv['node']['total']['value'],
-            'customer_name': inv['node']['customer']['name'],
-            'customer_email': inv['node']['customer']['email'],
-            'customer_phone': shipping_details.get('phone'),
-            'shipping_address_line_1': shipping_address[0],
-            'shipping_address_line_2': shipping_address[1],
-            'shipping_address_city': shipping_address[2],
-            'shipping_address_province': shipping_address[3],
-            'shipping_address_country': shipping_address[4],
-            'shipping_address_postal_code': shipping_address[5],
-            'address_line_1': address_details[0],
-            'address_line_2': address_details[1],
-            'address_city': address_details[2],
-            'address_province': address_details[3],
-            'address_country': address_details[4],
-            'address_postal_code': address_details[5],
-        })
+    line_1, line_2, city, province, country, postal_code = zip(*[
+        (
+            address.get('addressLine1'),
+            address.get('addressLine2'),
+            address.get('city'),
+            (address.get('province') or {}).get('name'),
+            (address.get('country') or {}).get('name'),
+            address.get('postalCode', None),
+        )
+        for address in addresses
+    ])
+    city = pd.Series(city, dtype=object)
+    province = pd.Series(province, dtype=object)
+
+    # "City, Province" in the city field wins over the province field
+    has_province = city.str.contains(', ', regex=False, na=False)
+    if has_province.any():
+        city_parts = city[has_province].str.rpartition(', ')
+        city = city.where(~has_province, city_parts[0])
+        province = province.where(~has_province, city_parts[2])
+
+    return list(line_1), list(line_2), city.tolist(), province.tolist(), list(country), list(postal_code)
+
+
+def parse_memos(memos):
+    """
+    Vectorised `parse_memo`, as (comments, companies) lists.
+
+    Most memos are empty or repeated, so each distinct memo is parsed once.
+    """
+    codes, uniques = pd.factorize(pd.Series(memos, dtype=object), use_na_sentinel=False)
+    components = pd.Series(uniques, dtype=object).str.extract(MEMO_RE)
+
+    return (
+        components['comment'].fillna('').str.strip().to_numpy()[codes].tolist(),
+        components['company'].fillna('').str.strip().to_numpy()[codes].tolist(),
+    )
+
+
+MONEY_COLUMNS = ('amountDue', 'amountPaid', 'total')
+ADDRESS_COLUMNS = ('line_1', 'line_2', 'city', 'province', 'country', 'postal_code')
+INVOICE_COLUMNS = (
+    'id', 'memo', 'status', 'invoice_number', 'last_sent_at', 'last_sent_via', 'createdAt',
+    'amountDue', 'amountPaid', 'total', 'customer_name', 'customer_email', 'customer_phone',
+    'shipping_address', 'address',
+)
+
+
+def _invoice_row(node):
+    # Projections other than "full" leave out customer, memo or items
+    customer = node.get('customer') or {}
+    shipping_details = customer.get('shippingDetails') or {}
+
+    return (
+        node['id'],
+        node.get('memo', ''),
+        node['status'],
+        node['invoiceNumber'],
+        node['lastSentAt'],
+        node['lastSentVia'],
+        node['createdAt'],
+        node['amountDue']['raw'],
+        node['amountPaid']['raw'],
+        node['total']['raw'],
+        customer.get('name'),
+        customer.get('email'),
+        shipping_details.get('phone'),
+        shipping_details.get('address') or {},
+        customer.get('address') or {},
+    )
+
+
+def _invoices_frame(rows):
+    fields = dict(zip(INVOICE_COLUMNS, zip(*rows) if rows else [()] * len(INVOICE_COLUMNS)))
+    shipping_address = sanitize_addresses(fields['shipping_address'])
+    address_details = sanitize_addresses(fields['address'])
+    comments, companies = parse_memos(fields['memo'])
+
+    data = {
+        'id': [decode_invoice_id(value)[1] for value in fields['id']],
+        'memo': fields['memo'],
+        'comment': comments,
+        'company': companies,
+        'status': fields['status'],
+        'invoice_number': fields['invoice_number'],
+        'last_sent_at': fields['last_sent_at'],
+        'last_sent_via': fields['last_sent_via'],
+        'registered_at': fields['createdAt'],
+        'createdAt': fields['createdAt'],
+        'amountDue': fields['amountDue'],
+        'amountPaid': fields['amountPaid'],
+        'total': fields['total'],
+        'customer_name': fields['customer_name'],
+        'customer_email': fields['customer_email'],
+        'customer_phone': fields['customer_phone'],
+        **{f'shipping_address_{column}': values for column, values in zip(ADDRESS_COLUMNS, shipping_address)},
+        **{f'address_{column}': values for column, values in zip(ADDRESS_COLUMNS, address_details)},
+    }
 
     df = pd.DataFrame(data)
-    df['total'] = df['total'].str.replace(',', '').astype(float)
-    df['amountDue'] = df['amountDue'].str.replace(',', '').astype(float)
-    df['amountPaid'] = df['amountPaid'].str.replace(',', '').astype(float)
+    # Wave's raw amounts are integer cents, sum those; the float views are for charts and tables
+    for column in MONEY_COLUMNS:
+        df[f'{column}_cents'] = df[column].astype('int64')
+        df[column] = df[f'{column}_cents'] / 100
     df['registered_at'] = pd.to_datetime(df['registered_at'])
     df['createdAt'] = pd.to_datetime(df['createdAt'])
     df['registered_at_date'] = df['registered_at'].dt.date
@@ -97,74 +208,482 @@ def invoices_to_df(invoices):
     return df
 
 
-def invoices_to_items_df(invoices):
-    data = []
+def invoices_to_df(invoices, compact=False):
+    """
+    Invoices frame, one row per invoice.
+
+    Fields are pulled out in a single pass over the payload and transposed into
+    columns; address and memo parsing run on whole columns rather than per invoice.
+    With `compact` the frame gets the `compact_df` schema.
+    """
+    df = _invoices_frame([_invoice_row(inv['node']) for inv in invoices])
+
+    return compact_df(df) if compact else df
 
+
+def invoices_to_frames(invoices, compact=False):
+    """
+    Invoices frame (as `invoices_to_df`) and a normalised items frame, from one
+    pass over the payload.
+
+    The items frame has one row per line item with only `invoice_id` and the item
+    columns (product_id, name, description, quantity, unitPrice); invoice
+    attributes are joined on demand, e.g.
+    `items_df.join(df.set_index('id')[['status']], on='invoice_id')`.
+    With `compact` both frames get the `compact_df` schema.
+    """
+    rows = []
+    item_rows = []
+    item_positions = []
     for inv in invoices:
-        shipping_details = inv['node']['customer'].get('shippingDetails') or {}
-        shipping_address = sanitize_address(shipping_details.get('address') or {})
-        address_details = sanitize_address(inv['node']['customer'].get('address') or {})
-        comment, company = parse_memo(inv['node']['memo'])
-
-        for item in inv['node']['items']:
-            _, invoice_id = decode_invoice_id(inv['node']['id'])
-            data.append({
-                'id': invoice_id,
-                'memo': inv['node']['memo'],
-                'comment': comment,
-                'company': company,
-                'status': inv['node']['status'],
-                'invoice_number': inv['node']['invoiceNumber'],
-                'last_sent_at': inv['node']['lastSentAt'],
-                'last_sent_via': inv['node']['lastSentVia'],
-                'registered_at': inv['node']['createdAt'],
-                'createdAt': inv['node']['createdAt'],
-                'amountDue': inv['node']['amountDue']['value'],
-                'amountPaid': inv['node']['amountPaid']['value'],
-                'total': inv['node']['total']['value'],
-                'customer_name': inv['node']['customer']['name'],
-                'customer_email': inv['node']['customer']['email'],
-                'customer_phone': shipping_details.get('phone'),
-                'shipping_address_line_1': shipping_address[0],
-                'shipping_address_line_2': shipping_address[1],
-                'shipping_address_city': shipping_address[2],
-                'shipping_address_province': shipping_address[3],
-                'shipping_address_country': shipping_address[4],
-                'shipping_address_postal_code': shipping_address[5],
-                'address_line_1': address_details[0],
-                'address_line_2': address_details[1],
-                'address_city': address_details[2],
-                'address_province': address_details[3],
-                'address_country': address_details[4],
-                'address_postal_code': address_details[5],
-                'quantity': item['quantity'],
-                'description': item['description'],
-                'unitPrice': item['unitPrice'],
-                'id': item['product']['id'],
-                'name': item['product']['name'],
-            })
+        node = inv['node']
+        for item in node.get('items', []):
+            item_positions.append(len(rows))
+            item_rows.append((
+                item['product']['id'],
+                item['product']['name'],
+                item['description'],
+                item['quantity'],
+                item['unitPrice'],
+            ))
+        rows.append(_invoice_row(node))
 
-    df = pd.DataFrame(data)
-    df['total'] = df['total'].str.replace(',', '').astype(float)
-    df['amountDue'] = df['amountDue'].str.replace(',', '').astype(float)
-    df['amountPaid'] = df['amountPaid'].str.replace(',', '').astype(float)
-    df['unitPrice'] = df['unitPrice'].str.replace(',', '').astype(float)
-    df['quantity'] = df['quantity'].astype(int)
-    df['registered_at'] = pd.to_datetime(df['registered_at'])
-    df['registered_at_date'] = df['registered_at'].dt.date
-    df['createdAt'] = pd.to_datetime(df['createdAt'])
-    df['createdAtDate'] = df['createdAt'].dt.date
+    df = _invoices_frame(rows)
 
-    return df
+    product_id, name, description, quantity, unit_price = zip(*item_rows) if item_rows else [()] * 5
+    items_df = pd.DataFrame({
+        # Invoice ids are decoded once per invoice and picked by position
+        'invoice_id': df['id'].to_numpy()[item_positions] if item_rows else [],
+        'product_id': product_id,
+        'name': name,
+        'description': description,
+        # Explicit dtypes, so a campaign without items still gets numeric columns
+        'quantity': np.array(quantity, dtype='int64'),
+        'unitPrice': pd.Series(unit_price, dtype=object).str.replace(',', '').astype(float),
+    })
+
+    if compact:
+        return compact_df(df), compact_df(items_df)
+
+    return df, items_df
+
+
+def utm_params(referrer):
+    """
+    Values of UTM_PARAMS in a referrer URL, repeated parameters joined with commas.
+    """
+    query = parse_qs(urlparse(referrer).query)
 
-def tracking_raw_to_df(data):
+    return tuple(','.join(query.get(param, [])) for param in UTM_PARAMS)
+
+
+def tracking_raw_to_df(data, compact=False):
+    """
+    Tracking frame with the UTM parameters of each referrer as categorical utm_* columns.
+
+    `data` is either a list of tracking items or {column: [values]}, as returned
+    by a column-oriented TrackingClient.sync_all.
+
+    Many donations share a referrer, so each distinct referrer is parsed once
+    and the results are spread back by the factorised codes.
+    """
     df = pd.DataFrame(data)
-    def apply_utm_campaign(value):
-        return ','.join(parse_qs(urlparse(value).query).get('utm_campaign', []))
-    df['utm_campaign'] = df['referrer'].apply(apply_utm_campaign)
+    codes, referrers = pd.factorize(df['referrer'])
+    # Missing referrers have code -1, which picks the empty row at the end
+    params = list(zip(*[utm_params(referrer) for referrer in referrers] + [('',) * len(UTM_PARAMS)]))
+    for param, values in zip(UTM_PARAMS, params):
+        value_codes, categories = pd.factorize(np.array(values, dtype=object), sort=True)
+        df[param] = pd.Categorical.from_codes(value_codes[codes], categories=categories)
 
-    def apply_utm_medium(value):
-        return ','.join(parse_qs(urlparse(value).query).get('utm_medium', []))
-    df['utm_medium'] = df['referrer'].apply(apply_utm_medium)
+    return compact_df(df) if compact else df
 
-    return df
+
+class CampaignAggregates:
+    """
+    Per-day rollups of a campaign's frames, for the page metrics, charts and tables.
+
+    Each cube is a frame indexed by (date, *dimensions) with counts and integer
+    cent sums, so a page reads totals for any date range by summing a few rows
+    per day instead of grouping every donation again.
+    """
+
+    def __init__(self, df, items_df):
+        paid = df[df['status'] == 'PAID']
+        abandoned = df[(df['status'] != 'PAID') & (df['status'] != 'DRAFT')]
+        date = 'createdAtDate'
+
+        paid_by_date = paid.groupby(date)
+        self.cubes = {
+            'daily': pd.DataFrame({
+                'donated': paid_by_date.size(),
+                'abandoned': abandoned.groupby(date).size(),
+                'amountPaid_cents': paid_by_date['amountPaid_cents'].sum(),
+            }).fillna(0).astype('int64'),
+            'amounts': paid.groupby([date, 'amountPaid']).size().to_frame('count'),
+            'company': paid.groupby([date, 'company']).agg(
+                customer_name=('customer_name', 'count'), amountPaid_cents=('amountPaid_cents', 'sum'),
+            ),
+        }
+        for param in UTM_PARAMS:
+            if param in paid:
+                self.cubes[param] = paid.groupby([date, param], observed=True)[['amountPaid_cents']].sum()
+
+        # Line items of paid invoices, with the invoice attributes the item tables use
+        items = items_df.join(
+            paid.set_index('id')[[date, 'customer_name', 'address_city', 'amountPaid_cents']], on='invoice_id', how='inner'
+        )
+        self.cubes['item'] = items.groupby([date, 'name'], observed=True)[['customer_name']].count()
+        self.cubes['item_city'] = items.groupby([date, 'name', 'address_city'], observed=True).agg(
+            createdAt=('invoice_id', 'size'), amountPaid_cents=('amountPaid_cents', 'sum'),
+        )
+
+    def _between(self, name, start, end):
+        cube = self.cubes[name]
+        dates = cube.index.get_level_values(0)
+        if start is not None:
+            cube = cube[dates >= start]
+            dates = cube.index.get_level_values(0)
+        if end is not None:
+            cube = cube[dates <= end]
+
+        return cube
+
+    @staticmethod
+    def _amounts(df):
+        # Cent sums become amounts only after summing, so totals carry no float error
+        for column in [column for column in df.columns if column.endswith('_cents')]:
+            df[column[:-len('_cents')]] = df.pop(column) / 100
+
+        return df
+
+    def daily(self, start=None, end=None):
+        """
+        Per-day donated and abandoned counts and amountPaid.
+        """
+        return self._amounts(self._between('daily', start, end).copy())
+
+    def chart_frame(self, start=None, end=None):
+        """
+        Days with paid donations as registered_at_date, donated and amountPaid
+        columns: all the daily chart needs, and no donor details.
+        """
+        daily = self.daily(start, end)
+
+        return daily.loc[daily['donated'] > 0, ['donated', 'amountPaid']].rename_axis('registered_at_date').reset_index()
+
+    def totals(self, start=None, end=None):
+        """
+        Donated and abandoned counts and amountPaid_cents over the date range.
+        """
+        return self._between('daily', start, end).sum()
+
+    def rollup(self, name, start=None, end=None):
+        """
+        Cube `name` summed over the date range, indexed by its other dimensions.
+        """
+        cube = self._between(name, start, end)
+        levels = list(range(1, cube.index.nlevels))
+
+        return self._amounts(cube.groupby(level=levels, observed=True).sum())
+
+
+class SearchIndex:
+    """
+    Case-insensitive substring search over a frame's SEARCH_COLUMNS.
+
+    The columns are lower-cased and joined into one Arrow-backed haystack per
+    row once, so a query is a single vectorised scan instead of one per column.
+    Results are kept per query, and a query that extends a cached one (the next
+    keystroke) only scans that query's hits.
+    """
+
+    def __init__(self, df, columns=SEARCH_COLUMNS):
+        fields = [df[column].astype(TEXT_DTYPE).fillna('').str.lower() for column in columns]
+        # The separator keeps a match from spanning two fields
+        self.haystack = fields[0].str.cat(fields[1:], sep='\x1f')
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def matches(self, query):
+        """
+        Index labels of the rows containing `query` in any search column.
+        """
+        query = query.lower()
+        with self.lock:
+            hits = self.results.get(query)
+            narrower = self.results.get(query[:-1])
+        if hits is not None:
+            return hits
+
+        haystack = self.haystack if narrower is None else self.haystack.loc[narrower]
+        hits = haystack.index[haystack.str.contains(query, regex=False).to_numpy(dtype=bool)]
+
+        with self.lock:
+            if len(self.results) >= SEARCH_CACHE_SIZE:
+                self.results.pop(next(iter(self.results)))
+            self.results[query] = hits
+
+        return hits
+
+
+class FilterEngine:
+    """
+    Row selection over a frame for the pages' tables.
+
+    Equality filters on `columns` are answered from per-value row bitmaps built
+    once per column, text filters from a SearchIndex, and the matching row positions are
+    cached per filter combination, so a rerun with the same filters is a lookup
+    and a changed filter is a few bitmap ANDs instead of masking the whole frame.
+    """
+
+    def __init__(self, df, columns=FILTER_COLUMNS, search_index=None):
+        self.df = df
+        self.search_index = search_index or SearchIndex(df)
+        self.bitmaps = {}
+        for column in columns:
+            codes, values = pd.factorize(df[column])
+            self.bitmaps[column] = {value: codes == i for i, value in enumerate(values)}
+        self.values = {}
+        self.results = {}
+        self.lock = threading.Lock()
+
+    def select(self, text='', between=None, **equals):
+        """
+        Rows whose `equals` columns have the given values (FILTER_ALL skips a
+        column), whose search columns contain `text`, and whose `between`
+        columns lie within the given inclusive (low, high) bounds.
+        """
+        between = between or {}
+        key = (text.lower(), tuple(sorted(between.items())), tuple(sorted(equals.items())))
+        with self.lock:
+            positions = self.results.get(key)
+
+        if positions is None:
+            positions = np.flatnonzero(self._mask(text, between, equals))
+            with self.lock:
+                if len(self.results) >= SEARCH_CACHE_SIZE:
+                    self.results.pop(next(iter(self.results)))
+                self.results[key] = positions
+
+        return self.df.iloc[positions]
+
+    def _mask(self, text, between, equals):
+        mask = np.ones(len(self.df), dtype=bool)
+        for column, value in equals.items():
+            if value != FILTER_ALL:
+                # A value that never occurs matches no rows
+                mask &= self.bitmaps[column].get(value, False)
+        for column, (low, high) in between.items():
+            values = self._values(column)
+            low, high = np.array([low, high], dtype=values.dtype)
+            mask &= (values >= low) & (values <= high)
+        if text:
+            mask &= self.df.index.isin(self.search_index.matches(text))
+
+        return mask
+
+    def _values(self, column):
+        # Date objects compare one by one, datetime64 compares vectorised
+        values = self.values.get(column)
+        if values is None:
+            values = self.values[column] = self.df[column].to_numpy()
+            if pd.api.types.infer_dtype(values) == 'date':
+                values = self.values[column] = values.astype('datetime64[D]')
+
+        return values
+
+
+@st.cache_resource(max_entries=8)
+def campaign_aggregates(key, _df, _items_df):
+    """
+    CampaignAggregates of `campaign_frames`, built once per the same `key`.
+    """
+    return CampaignAggregates(_df, _items_df)
+
+
+@st.cache_resource(max_entries=16)
+def campaign_filters(key, _df, columns=FILTER_COLUMNS):
+    """
+    FilterEngine (with its SearchIndex) of a campaign frame, built once per
+    `key` and `columns`.
+
+    `key` must identify the frame's contents, e.g. the slug and snapshot
+    versions it was built from, as for `campaign_frames`.
+    """
+    return FilterEngine(_df, columns)
+
+
+def daily_chart_frame(paid):
+    """
+    Days of a paid-invoices frame as registered_at_date, donated and amountPaid
+    columns, the same shape as `CampaignAggregates.chart_frame`, for pages with
+    their own frames.
+    """
+    by_date = paid.groupby('registered_at_date')
+
+    return pd.DataFrame({
+        'donated': by_date.size(),
+        'amountPaid': by_date['amountPaid'].sum(),
+    }).reset_index()
+
+
+@st.cache_resource(max_entries=8)
+def campaign_chart_frame(key, _paid):
+    """
+    `daily_chart_frame` of `_paid`, built once per `key` (slug plus snapshot version).
+    """
+    return daily_chart_frame(_paid)
+
+
+def paginated_table(df, columns, key):
+    """
+    Render `df[columns]` a page at a time, with sorting and a row count.
+
+    Sorting and slicing happen here, so only the visible window is sent to the
+    browser. `key` prefixes the widget keys, one per table on a page.
+    """
+    c0, c1, c2, c3 = st.columns(4)
+    sort_column = c0.selectbox(
+        "Sort by", (None, *columns), format_func=lambda column: "—" if column is None else column, key=f"{key}_sort"
+    )
+    descending = c1.selectbox("Order", ("Ascending", "Descending"), key=f"{key}_order") == "Descending"
+    page_size = c2.selectbox("Rows per page", TABLE_PAGE_SIZES, key=f"{key}_page_size")
+    pages = max(1, -(-len(df) // page_size))
+    page_key = f"{key}_page"
+    # Filters may have shrunk the table since the page was picked
+    if st.session_state.get(page_key, 1) > pages:
+        st.session_state[page_key] = pages
+    page = c3.number_input("Page", min_value=1, max_value=pages, step=1, key=page_key)
+
+    if sort_column is None:
+        positions = np.arange(len(df))
+        if descending:
+            positions = positions[::-1]
+    else:
+        column = df[sort_column].reset_index(drop=True)
+        positions = column.sort_values(ascending=not descending, kind='stable', na_position='last').index.to_numpy()
+
+    start = (page - 1) * page_size
+    window = df.iloc[positions[start:start + page_size]][columns]
+    if len(window):
+        st.caption(f"Rows {start + 1}–{start + len(window)} of {len(df)}, page {page} of {pages}")
+    st.dataframe(window)
+
+
+class InvoicesPreview:
+    """
+    Headline metrics and daily totals rendered from invoice pages as they arrive.
+
+    Only usable from the script thread, i.e. for loads on the request path;
+    updates from any other thread are ignored.
+    """
+
+    def __init__(self):
+        self.thread = threading.get_ident()
+        self.placeholder = st.empty()
+        self.loaded = 0
+        self.total_collected = 0
+        self.total_donated = 0
+        self.total_abandoned = 0
+        self.daily = None
+
+    def update(self, invoices):
+        if not invoices or threading.get_ident() != self.thread:
+            return
+
+        df = invoices_to_df(invoices)
+        df_paid = df[df['status'] == 'PAID']
+        self.loaded += len(df)
+        self.total_collected += df_paid['amountPaid_cents'].sum()
+        self.total_donated += len(df_paid)
+        self.total_abandoned += ((df['status'] != 'PAID') & (df['status'] != 'DRAFT')).sum()
+
+        daily = df_paid.groupby('registered_at_date')['amountPaid'].sum()
+        self.daily = daily if self.daily is None else self.daily.add(daily, fill_value=0)
+
+        with self.placeholder.container():
+            st.caption(f"Loading... {self.loaded} invoices so far")
+            c0, c1, c2, c3 = st.columns(4)
+            c0.metric("Total collected", f"{self.total_collected / 100:.2f}")
+            c2.metric("Total donated", self.total_donated)
+            c3.metric("Total abandoned", self.total_abandoned)
+            st.bar_chart(self.daily)
+
+    def clear(self):
+        self.placeholder.empty()
+
+
+def load_campaign_invoices(wave, slug, interval=600, concurrency=None, versioned=False):
+    """
+    Campaign invoices from the shared refresh scheduler, with their snapshot
+    version as (invoices, version) if `versioned`.
+
+    Only the first load in the process runs on the request path, with an
+    InvoicesPreview while pages arrive; later refreshes happen in the background.
+    """
+    def fetch():
+        return wave.sync_invoices_for_slug(slug, concurrency=concurrency)
+
+    def first_fetch():
+        preview = InvoicesPreview()
+        invoices = wave.sync_invoices_for_slug(slug, concurrency=concurrency, on_page=preview.update)
+        preview.clear()
+        return invoices
+
+    result = get_refresh_scheduler().get_versioned(('invoices', slug.upper()), fetch, interval, first_fetch)
+
+    return result if versioned else result[0]
+
+
+def load_tracking_data(tracking, interval=600, scheduler=None, versioned=False):
+    scheduler = scheduler or get_refresh_scheduler()
+    result = scheduler.get_versioned(('tracking', tracking.business_id), tracking.sync_all, interval)
+
+    return result if versioned else result[0]
+
+
+def load_campaign_data(wave, tracking, slug, interval=600, concurrency=None, versioned=False):
+    """
+    Campaign invoices and tracking data, fetched in parallel.
+
+    The tracking read runs on a loader thread while the invoices load on the
+    script thread, where their preview can render, so a cold load takes about
+    as long as the slower of the two.
+    """
+    # Resolve the scheduler here, cache_resource lookups belong on the script thread
+    scheduler = get_refresh_scheduler()
+    tracking_data = LOADER.submit(load_tracking_data, tracking, interval, scheduler, versioned)
+    invoices = load_campaign_invoices(wave, slug, interval, concurrency, versioned)
+
+    return invoices, tracking_data.result()
+
+
+@st.cache_resource(max_entries=8)
+def campaign_frames(key, _invoices, _tracking_data):
+    """
+    Compact invoices frame joined with tracking data, and the items frame.
+
+    Built once per `key` (slug plus snapshot versions) and shared by all
+    sessions, so callers must not modify the frames in place.
+    """
+    df, items_df = invoices_to_frames(_invoices, compact=True)
+    tracking_df = tracking_raw_to_df(_tracking_data, compact=True)
+    df = df.join(tracking_df.set_index('donation_id'), on='id', how='left', rsuffix='tracking')
+
+    return df, items_df
+
+
+def load_campaign_frames(wave, tracking, slug, interval=600, concurrency=None):
+    """
+    `campaign_frames` with their `campaign_aggregates` and `campaign_filters`
+    for the current invoices and tracking snapshots; reruns reuse all of them
+    until either snapshot is refreshed.
+    """
+    (invoices, invoices_version), (tracking_data, tracking_version) = load_campaign_data(
+        wave, tracking, slug, interval, concurrency, versioned=True
+    )
+
+    key = (slug.upper(), invoices_version, tracking_version)
+    df, items_df = campaign_frames(key, invoices, tracking_data)
+
+    return df, items_df, campaign_aggregates(key, df, items_df), campaign_filters(key, df)
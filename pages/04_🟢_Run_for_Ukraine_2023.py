@@ -1,21 +1,17 @@
 import streamlit as st
 import altair as alt
-from clients import WaveClient, TrackingClient
-from common import invoices_to_df, invoices_to_items_df, tracking_raw_to_df
+from clients import get_wave_client, get_tracking_client
+from scheduler import get_refresh_scheduler
+from common import load_campaign_frames, paginated_table
 
 
-wave = WaveClient()
-tracking = TrackingClient(aws_key=st.secrets['aws']['AWS_ACCESS_KEY_ID'], aws_secret=st.secrets['aws']['AWS_SECRET_ACCESS_KEY'])
+wave = get_wave_client()
+tracking = get_tracking_client()
 
 CAMPAIGN = "2FUA-RFUA2023"
 
-@st.cache_data(ttl=600)
-def get_capmaign_invoices(slug):
-    return wave.get_invoices_for_slug(slug)
-
-@st.cache_data(ttl=600)
-def get_tracking_data():
-    return tracking.get_all()
+def get_campaign_frames(slug):
+    return load_campaign_frames(wave, tracking, slug, interval=600, concurrency=4)
 
 @st.cache_data
 def convert_df(df):
@@ -35,37 +31,24 @@ if st.session_state.get('shall_pass'):
 
     st.title(f"{CAMPAIGN} stats")
     c0, c1 = st.columns(2)
-    invoices = get_capmaign_invoices(CAMPAIGN)
-    try:
-        all_df = invoices_to_df(invoices)
-    except Exception:
-        print(invoices)
-        raise
+    all_df, _, aggregates, filters = get_campaign_frames(CAMPAIGN)
     
     start_date = c0.date_input("Start date", value=all_df['createdAtDate'].min())
     end_date = c1.date_input("End date", value=all_df['createdAtDate'].max())
 
-    all_items_df = invoices_to_items_df(invoices)
-    
-    df = all_df[(all_df['createdAtDate'] >= start_date) & (all_df['createdAtDate'] <= end_date)]
-    items_df = all_items_df[(all_items_df['createdAtDate'] >= start_date) & (all_items_df['createdAtDate'] <= end_date)]
-    tracking_df = tracking_raw_to_df(get_tracking_data())
-
-    df = df.join(tracking_df.set_index('donation_id'), on='id', how='left', rsuffix='tracking')
+    df = filters.select(between={'createdAtDate': (start_date, end_date)})
 
-    df_paid = df[df['status'] == 'PAID']
-    df_paid_unconfired = df_paid[df_paid['last_sent_via'] == 'NOT_SENT']
-    invoices_df_unpaid = df[(df['status'] != 'PAID') & (df['status'] != 'DRAFT')]
-    items_df_paid = items_df[items_df['status'] == 'PAID']
+    totals = aggregates.totals(start_date, end_date)
 
     c0, c1, c2, c3 = st.columns(4)
-    c0.metric("Total collected", f"{df_paid['amountPaid'].sum():.2f}")
-    c2.metric("Total donated", len(df_paid))
-    c3.metric("Total abandoned", len(invoices_df_unpaid))
+    c0.metric("Total collected", f"{totals['amountPaid_cents'] / 100:.2f}")
+    c2.metric("Total donated", int(totals['donated']))
+    c3.metric("Total abandoned", int(totals['abandoned']))
 
     st.write("Amounts distribution")
-    st.bar_chart(df_paid['amountPaid'].value_counts())
+    st.bar_chart(aggregates.rollup('amounts', start_date, end_date)['count'])
     
+    chart_df = aggregates.chart_frame(start_date, end_date)
     hover = alt.selection_single(
         fields=["registered_at_date"],
         nearest=True,
@@ -73,7 +56,7 @@ if st.session_state.get('shall_pass'):
         # empty="none",
         clear="mouseout"
     )
-    amount_chart = alt.Chart(df_paid).mark_bar(color='#57A44C').encode(
+    amount_chart = alt.Chart(chart_df).mark_bar(color='#57A44C').encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
         y=alt.Y('sum(amountPaid):Q', axis=alt.Axis(title='Sum of amountPaid', titleColor='#57A44C')),
     )
@@ -86,9 +69,9 @@ if st.session_state.get('shall_pass'):
     ).encode(
         text='sum(amountPaid):Q'
     )
-    count_chart = alt.Chart(df_paid).mark_circle(color='#007bff', size=60).encode(
+    count_chart = alt.Chart(chart_df).mark_circle(color='#007bff', size=60).encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
-        y=alt.Y('count():Q',
+        y=alt.Y('sum(donated):Q',
           axis=alt.Axis(title='Count of Donations', titleColor='#007bff')),
     )
     st.altair_chart(alt.layer(amount_chart + text_chart, count_chart).resolve_scale(
@@ -98,15 +81,15 @@ if st.session_state.get('shall_pass'):
     ).configure(padding=50).interactive(), use_container_width=True)
 
     st.header("By item")
-    st.table(items_df_paid.groupby('name').count()['customer_name'])
-    st.table(items_df_paid.groupby(by=['name', 'address_city']).count()['createdAt'])
-    st.table(items_df_paid[['name', 'address_city', 'amountPaid']].groupby(by=['name', 'address_city']).sum()['amountPaid'])
+    st.table(aggregates.rollup('item', start_date, end_date)['customer_name'])
+    st.table(aggregates.rollup('item_city', start_date, end_date)['createdAt'])
+    st.table(aggregates.rollup('item_city', start_date, end_date)['amountPaid'])
     
     st.header("By UTM campaign")
-    st.table(df_paid[['utm_campaign', 'amountPaid']].groupby('utm_campaign').sum()['amountPaid'])
+    st.table(aggregates.rollup('utm_campaign', start_date, end_date)['amountPaid'])
 
     st.header("By UTM medium")
-    st.table(df_paid[['utm_medium', 'amountPaid']].groupby('utm_medium').sum()['amountPaid'])
+    st.table(aggregates.rollup('utm_medium', start_date, end_date)['amountPaid'])
 
     st.header("Notes")
     paid_memos = df[(df['memo'].str.len() > 0)]
@@ -117,31 +100,19 @@ if st.session_state.get('shall_pass'):
     show_donors = st.checkbox("Show donors", False)
     if show_donors:
         c0, c1, c2= st.columns(3)
-        show_df = df
         filter_status = c0.selectbox("Paid status", ("ALL", "PAID", "SAVED", "VIEWED", "OVERDUE"), index=1)
         filter_sent_status = c1.selectbox("Email Confirmation", ("ALL", "NOT_SENT", "MARKED_SENT"), index=0)
         filter_text = c2.text_input("Search fields")
-        show_columns = st.multiselect("Show columns", list(show_df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'memo', 'registered_at'])
-        if filter_status != "ALL":
-            show_df = show_df[show_df['status'] == filter_status]
-        if filter_sent_status != "ALL":
-            show_df = show_df[show_df['last_sent_via'] == filter_sent_status]
-        if filter_text:
-            search = (
-                show_df['customer_name'].str.contains(filter_text, case=False) |
-                show_df['customer_email'].str.contains(filter_text, case=False) |
-                show_df['invoice_number'].str.contains(filter_text, case=False) |
-                show_df['customer_phone'].str.contains(filter_text, case=False) |
-                show_df['address_city'].str.contains(filter_text, case=False) |
-                show_df['address_province'].str.contains(filter_text, case=False) |
-                show_df['address_postal_code'].str.contains(filter_text, case=False) |
-                show_df['address_line_1'].str.contains(filter_text, case=False) |
-                show_df['memo'].str.contains(filter_text, case=False)
-            )
-            show_df = show_df[search]
+        show_columns = st.multiselect("Show columns", list(df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'memo', 'registered_at'])
+        show_df = filters.select(
+            text=filter_text,
+            between={'createdAtDate': (start_date, end_date)},
+            status=filter_status,
+            last_sent_via=filter_sent_status,
+        )
 
         st.markdown(f"Showing {len(show_df)} out of all {len(df)}")
-        st.write(show_df[show_columns])
+        paginated_table(show_df, show_columns, key='donors')
         st.download_button(
             label="Download the donors table above as CSV",
             data=convert_df(show_df[show_columns]),
@@ -152,3 +123,4 @@ if st.session_state.get('shall_pass'):
     st.markdown("---")
     if st.button("Clear cache"):
         st.cache_data.clear()
+        get_refresh_scheduler().clear()
@@ -1,16 +1,16 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from clients import WaveClient
-from geopy.geocoders import Nominatim
+from clients import get_wave_client, get_geolocator
+from scheduler import get_refresh_scheduler
+from common import load_campaign_invoices, campaign_chart_frame, campaign_filters, paginated_table
 
 
-wave = WaveClient()
-geolocator = Nominatim(user_agent="example app")
+wave = get_wave_client()
+geolocator = get_geolocator()
 
-@st.cache_data(ttl=600)
 def get_runforukraine_invoices(slug):
-    return wave.get_invoices_for_slug(slug)
+    return load_campaign_invoices(wave, slug, interval=3600, versioned=True)
 
 
 @st.cache_data
@@ -142,6 +142,14 @@ def invoices_to_items_df(invoices):
 
     return df
 
+@st.cache_resource(max_entries=4)
+def get_region_tables(key, _df_paid):
+    # Built once per invoices version and shared by all sessions; countries are from the shipping address
+    return (
+        _df_paid.groupby(['address_country']).count()['customer_name'],
+        _df_paid.groupby(['address_country', 'address_province']).count()['customer_name'],
+    )
+
 @st.cache_data
 def convert_df(df):
     # IMPORTANT: Cache the conversion to prevent computation on every rerun
@@ -160,7 +168,7 @@ if st.session_state.get('shall_pass'):
     show_map = st.checkbox("Show map", False)
 
     st.title("Run For Ukraine registration stats")
-    invoices = get_runforukraine_invoices("2FUA-RUN4UA")
+    invoices, version = get_runforukraine_invoices("2FUA-RUN4UA")
     try:
         df = invoices_to_df(invoices, show_map=show_map)
     except Exception:
@@ -179,6 +187,7 @@ if st.session_state.get('shall_pass'):
     c2.metric("Total registered", len(df_paid))
     c3.metric("Total abandoned", len(invoices_df_unpaid))
 
+    chart_df = campaign_chart_frame(("2FUA-RUN4UA", version), df_paid)
     hover = alt.selection_single(
         fields=["registered_at_date"],
         nearest=True,
@@ -186,7 +195,7 @@ if st.session_state.get('shall_pass'):
         # empty="none",
         clear="mouseout"
     )
-    amount_chart = alt.Chart(df_paid).mark_bar(color='#57A44C').encode(
+    amount_chart = alt.Chart(chart_df).mark_bar(color='#57A44C').encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
         y=alt.Y('sum(amountPaid):Q', axis=alt.Axis(title='Sum of amountPaid', titleColor='#57A44C')),
     )
@@ -199,9 +208,9 @@ if st.session_state.get('shall_pass'):
     ).encode(
         text='sum(amountPaid):Q'
     )
-    count_chart = alt.Chart(df_paid).mark_circle(color='#007bff', size=60).encode(
+    count_chart = alt.Chart(chart_df).mark_circle(color='#007bff', size=60).encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
-        y=alt.Y('count():Q',
+        y=alt.Y('sum(donated):Q',
           axis=alt.Axis(title='Count of Donations', titleColor='#007bff')),
     )
     st.altair_chart(alt.layer(amount_chart + text_chart, count_chart).resolve_scale(
@@ -210,11 +219,12 @@ if st.session_state.get('shall_pass'):
         hover
     ).configure(padding=50).interactive(), use_container_width=True)
 
+    by_country, by_province = get_region_tables(("2FUA-RUN4UA", version), df_paid)
     st.header("By country")
-    st.table(df_paid.groupby(['address_country']).count()['customer_name'])
+    st.table(by_country)
 
     with st.expander("By province/state"):
-        st.table(df_paid.groupby(['address_country', 'address_province']).count()['customer_name'])
+        st.table(by_province)
 
     st.header("By item")
     st.table(items_df_paid.groupby('name').count()['customer_name'])
@@ -232,34 +242,22 @@ if st.session_state.get('shall_pass'):
     show_participants = st.checkbox("Show participants", False)
     if show_participants:
         c0, c1, c2, c3 = st.columns(4)
-        show_df = df
         filter_status = c0.selectbox("Registration status", ("ALL", "PAID", "SAVED", "VIEWED", "OVERDUE"), index=1)
         filter_sent_status = c1.selectbox("Email Confirmation", ("ALL", "NOT_SENT", "MARKED_SENT"), index=1)
-        filter_country = c2.selectbox("Country", ["ALL", *show_df['address_country'].unique()])
+        filter_country = c2.selectbox("Country", ["ALL", *df['address_country'].unique()])
         filter_text = c3.text_input("Search fields")
-        show_columns = st.multiselect("Show columns", list(show_df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'address_country', 'registered_at'])
-        if filter_status != "ALL":
-            show_df = show_df[show_df['status'] == filter_status]
-        if filter_sent_status != "ALL":
-            show_df = show_df[show_df['last_sent_via'] == filter_sent_status]
-        if filter_country != "ALL":
-            show_df = show_df[show_df['address_country'] == filter_country]
-        if filter_text:
-            search = (
-                show_df['customer_name'].str.contains(filter_text, case=False) |
-                show_df['customer_email'].str.contains(filter_text, case=False) |
-                show_df['invoice_number'].str.contains(filter_text, case=False) |
-                show_df['customer_phone'].str.contains(filter_text, case=False) |
-                show_df['address_city'].str.contains(filter_text, case=False) |
-                show_df['address_province'].str.contains(filter_text, case=False) |
-                show_df['address_postal_code'].str.contains(filter_text, case=False) |
-                show_df['address_line_1'].str.contains(filter_text, case=False) |
-                show_df['memo'].str.contains(filter_text, case=False)
-            )
-            show_df = show_df[search]
+        show_columns = st.multiselect("Show columns", list(df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'address_country', 'registered_at'])
+        # The frame has map coordinates only with show_map
+        filters = campaign_filters(("2FUA-RUN4UA", version, 'participants', show_map), df, ('status', 'last_sent_via', 'address_country'))
+        show_df = filters.select(
+            text=filter_text,
+            status=filter_status,
+            last_sent_via=filter_sent_status,
+            address_country=filter_country,
+        )
 
         st.markdown(f"Showing {len(show_df)} out of all {len(df)}")
-        st.write(show_df[show_columns])
+        paginated_table(show_df, show_columns, key='participants')
         st.download_button(
             label="Download the participants table above as CSV",
             data=convert_df(show_df[show_columns]),
@@ -270,30 +268,14 @@ if st.session_state.get('shall_pass'):
     show_items = st.checkbox("Show items", False)
     if show_items:
         c0, c1 = st.columns(2)
-        show_df = items_df
         filter_status = c0.selectbox("Status", ("ALL", "PAID", "SAVED", "VIEWED", "OVERDUE"), index=1)
         filter_text = c1.text_input("Search")
-        filter_item = st.selectbox("Item", ("ALL", *list(show_df['name'].unique())))
-        show_columns = st.multiselect("Show columns", list(show_df.columns), ['invoice_number', 'status', 'address_country', 'name', 'quantity', 'customer_name', 'amountPaid'])
-        if filter_status != "ALL":
-            show_df = show_df[show_df['status'] == filter_status]
-        if filter_item != "ALL":
-            show_df = show_df[show_df['name'] == filter_item]
-        if filter_text:
-            search = (
-                show_df['customer_name'].str.contains(filter_text, case=False) |
-                show_df['customer_email'].str.contains(filter_text, case=False) |
-                show_df['invoice_number'].str.contains(filter_text, case=False) |
-                show_df['customer_phone'].str.contains(filter_text, case=False) |
-                show_df['address_city'].str.contains(filter_text, case=False) |
-                show_df['address_province'].str.contains(filter_text, case=False) |
-                show_df['address_postal_code'].str.contains(filter_text, case=False) |
-                show_df['address_line_1'].str.contains(filter_text, case=False) |
-                show_df['memo'].str.contains(filter_text, case=False)
-            )
-            show_df = show_df[search]
+        filter_item = st.selectbox("Item", ("ALL", *list(items_df['name'].unique())))
+        show_columns = st.multiselect("Show columns", list(items_df.columns), ['invoice_number', 'status', 'address_country', 'name', 'quantity', 'customer_name', 'amountPaid'])
+        filters = campaign_filters(("2FUA-RUN4UA", version, 'items'), items_df, ('status', 'name'))
+        show_df = filters.select(text=filter_text, status=filter_status, name=filter_item)
         st.markdown(f"Showing {len(show_df)} out of all {len(items_df)}")
-        st.write(show_df[show_columns])
+        paginated_table(show_df, show_columns, key='items')
         st.download_button(
             label="Download the items table above as CSV",
             data=convert_df(show_df[show_columns]),
@@ -304,3 +286,4 @@ if st.session_state.get('shall_pass'):
     st.markdown("---")
     if st.button("Clear cache"):
         st.cache_data.clear()
+        get_refresh_scheduler().clear()
@@ -1,18 +1,17 @@
 import streamlit as st
 import pandas as pd
 import altair as alt
-from clients import WaveClient
-from geopy.geocoders import Nominatim
+from clients import get_wave_client
+from scheduler import get_refresh_scheduler
+from common import load_campaign_invoices, campaign_chart_frame, campaign_filters, paginated_table
 
 
-wave = WaveClient()
-geolocator = Nominatim(user_agent="example app")
+wave = get_wave_client()
 
 CAMPAIGN = "UW-ST4ST"
 
-@st.cache_data(ttl=600)
 def get_capmaign_invoices(slug):
-    return wave.get_invoices_for_slug(slug)
+    return load_campaign_invoices(wave, slug, interval=3600, versioned=True)
 
 
 def invoices_to_df(invoices):
@@ -131,7 +130,7 @@ if st.session_state.get('shall_pass'):
     st.info("OK")
 
     st.title(f"{CAMPAIGN} stats")
-    invoices = get_capmaign_invoices(CAMPAIGN)
+    invoices, version = get_capmaign_invoices(CAMPAIGN)
     try:
         df = invoices_to_df(invoices)
     except Exception:
@@ -153,6 +152,7 @@ if st.session_state.get('shall_pass'):
     st.write("Amounts distribution")
     st.bar_chart(df_paid['amountPaid'].value_counts())
     
+    chart_df = campaign_chart_frame((CAMPAIGN, version), df_paid)
     hover = alt.selection_single(
         fields=["registered_at_date"],
         nearest=True,
@@ -160,7 +160,7 @@ if st.session_state.get('shall_pass'):
         # empty="none",
         clear="mouseout"
     )
-    amount_chart = alt.Chart(df_paid).mark_bar(color='#57A44C').encode(
+    amount_chart = alt.Chart(chart_df).mark_bar(color='#57A44C').encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
         y=alt.Y('sum(amountPaid):Q', axis=alt.Axis(title='Sum of amountPaid', titleColor='#57A44C')),
     )
@@ -173,9 +173,9 @@ if st.session_state.get('shall_pass'):
     ).encode(
         text='sum(amountPaid):Q'
     )
-    count_chart = alt.Chart(df_paid).mark_circle(color='#007bff', size=60).encode(
+    count_chart = alt.Chart(chart_df).mark_circle(color='#007bff', size=60).encode(
         x=alt.X('registered_at_date:T', axis=alt.Axis(title='Date')),
-        y=alt.Y('count():Q',
+        y=alt.Y('sum(donated):Q',
           axis=alt.Axis(title='Count of Donations', titleColor='#007bff')),
     )
     st.altair_chart(alt.layer(amount_chart + text_chart, count_chart).resolve_scale(
@@ -196,31 +196,15 @@ if st.session_state.get('shall_pass'):
     show_donors = st.checkbox("Show donors", False)
     if show_donors:
         c0, c1, c2= st.columns(3)
-        show_df = df
         filter_status = c0.selectbox("Paid status", ("ALL", "PAID", "SAVED", "VIEWED", "OVERDUE"), index=1)
         filter_sent_status = c1.selectbox("Email Confirmation", ("ALL", "NOT_SENT", "MARKED_SENT"), index=1)
         filter_text = c2.text_input("Search fields")
-        show_columns = st.multiselect("Show columns", list(show_df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'memo', 'registered_at'])
-        if filter_status != "ALL":
-            show_df = show_df[show_df['status'] == filter_status]
-        if filter_sent_status != "ALL":
-            show_df = show_df[show_df['last_sent_via'] == filter_sent_status]
-        if filter_text:
-            search = (
-                show_df['customer_name'].str.contains(filter_text, case=False) |
-                show_df['customer_email'].str.contains(filter_text, case=False) |
-                show_df['invoice_number'].str.contains(filter_text, case=False) |
-                show_df['customer_phone'].str.contains(filter_text, case=False) |
-                show_df['address_city'].str.contains(filter_text, case=False) |
-                show_df['address_province'].str.contains(filter_text, case=False) |
-                show_df['address_postal_code'].str.contains(filter_text, case=False) |
-                show_df['address_line_1'].str.contains(filter_text, case=False) |
-                show_df['memo'].str.contains(filter_text, case=False)
-            )
-            show_df = show_df[search]
+        show_columns = st.multiselect("Show columns", list(df.columns), ['invoice_number', 'customer_name', 'amountPaid', 'status', 'memo', 'registered_at'])
+        filters = campaign_filters((CAMPAIGN, version, 'donors'), df)
+        show_df = filters.select(text=filter_text, status=filter_status, last_sent_via=filter_sent_status)
 
         st.markdown(f"Showing {len(show_df)} out of all {len(df)}")
-        st.write(show_df[show_columns])
+        paginated_table(show_df, show_columns, key='donors')
         st.download_button(
             label="Download the donors table above as CSV",
             data=convert_df(show_df[show_columns]),
@@ -231,3 +215,4 @@ if st.session_state.get('shall_pass'):
     st.markdown("---")
     if st.button("Clear cache"):
         st.cache_data.clear()
+        get_refresh_scheduler().clear()
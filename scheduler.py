@@ -0,0 +1,179 @@
+import time
+import logging
+import itertools
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+
+import streamlit as st
+
+
+logger = logging.getLogger(__name__)
+
+# Refresh when this share of the interval has passed, so the snapshot never gets older than the interval
+REFRESH_AHEAD = 0.8
+REFRESH_WORKERS = 4
+
+
+# Handed to waiters when the leader was interrupted rather than failed
+_RETRY = object()
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls for the same key into one.
+
+    The first caller runs the function; everyone arriving while it is in flight
+    waits for it and gets the same result (or exception). If the leader is
+    interrupted by a BaseException, such as Streamlit stopping or rerunning its
+    session, nothing is shared: the waiters retry and one of them leads.
+    """
+
+    def __init__(self):
+        self.calls = {}
+        self.lock = threading.Lock()
+
+    def do(self, key, fn):
+        while True:
+            with self.lock:
+                call = self.calls.get(key)
+                leader = call is None
+                if leader:
+                    call = self.calls[key] = Future()
+
+            if leader:
+                break
+
+            result = call.result()
+            if result is not _RETRY:
+                return result
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._release(key)
+            call.set_exception(e)
+            raise
+        except BaseException:
+            self._release(key)
+            call.set_result(_RETRY)
+            raise
+
+        self._release(key)
+        call.set_result(result)
+
+        return result
+
+    def _release(self, key):
+        # Before resolving the call, so retrying waiters don't find it again
+        with self.lock:
+            del self.calls[key]
+
+
+class Snapshot:
+
+    def __init__(self, key, fetch, interval, value):
+        self.key = key
+        self.fetch = fetch
+        self.interval = interval
+        self.value = value
+        self.version = None
+        self.refreshed_at = time.monotonic()
+        self.refreshing = False
+
+    @property
+    def due_at(self):
+        return self.refreshed_at + self.interval * REFRESH_AHEAD
+
+
+class RefreshScheduler:
+    """
+    Stale-while-revalidate store for remote data.
+
+    `get` serves the last good snapshot right away and only fetches on the request
+    path the very first time a key is asked for, once for all sessions asking at
+    the same time. After that a background thread refetches each key shortly
+    before its interval runs out; if a refresh fails the previous snapshot keeps
+    being served and the refresh is retried next interval.
+
+    Every stored value gets a process-wide unique version, so data derived from
+    a snapshot can be cached by (key, version). A refresh that fetches a value
+    equal to the current one keeps its version, so those caches stay warm.
+    """
+
+    def __init__(self):
+        self.snapshots = {}
+        self.lock = threading.Lock()
+        self.versions = itertools.count()
+        self.flights = SingleFlight()
+        self.wakeup = threading.Event()
+        self.executor = ThreadPoolExecutor(max_workers=REFRESH_WORKERS, thread_name_prefix='refresh')
+        threading.Thread(target=self._run, name='refresh-scheduler', daemon=True).start()
+
+    def get(self, key, fetch, interval=600, first_fetch=None):
+        """
+        Return the snapshot for `key`, calling `first_fetch` (defaults to `fetch`)
+        if there is none yet. Background refreshes always use `fetch`.
+        """
+        return self.get_versioned(key, fetch, interval, first_fetch)[0]
+
+    def get_versioned(self, key, fetch, interval=600, first_fetch=None):
+        """
+        Same as `get`, returning (value, version).
+        """
+        with self.lock:
+            snapshot = self.snapshots.get(key)
+
+        if snapshot is None:
+            snapshot = self.flights.do(key, lambda: self._load(key, fetch, interval, first_fetch))
+
+        with self.lock:
+            return snapshot.value, snapshot.version
+
+    def _load(self, key, fetch, interval, first_fetch):
+        snapshot = Snapshot(key, fetch, interval, (first_fetch or fetch)())
+        with self.lock:
+            snapshot.version = next(self.versions)
+            self.snapshots[key] = snapshot
+        self.wakeup.set()
+
+        return snapshot
+
+    def clear(self):
+        with self.lock:
+            self.snapshots.clear()
+
+    def _run(self):
+        while True:
+            now = time.monotonic()
+            with self.lock:
+                due = [snapshot for snapshot in self.snapshots.values() if not snapshot.refreshing and snapshot.due_at <= now]
+                for snapshot in due:
+                    snapshot.refreshing = True
+
+            for snapshot in due:
+                self.executor.submit(self._refresh, snapshot)
+
+            with self.lock:
+                next_due = min((snapshot.due_at for snapshot in self.snapshots.values() if not snapshot.refreshing), default=None)
+
+            self.wakeup.wait(None if next_due is None else max(next_due - time.monotonic(), 0))
+            self.wakeup.clear()
+
+    def _refresh(self, snapshot):
+        try:
+            value = snapshot.fetch()
+            if value != snapshot.value:
+                with self.lock:
+                    snapshot.value = value
+                    snapshot.version = next(self.versions)
+        except Exception:
+            logger.exception("Refresh failed for %r, serving the previous snapshot", snapshot.key)
+        finally:
+            snapshot.refreshed_at = time.monotonic()
+            snapshot.refreshing = False
+            self.wakeup.set()
+
+
+@st.cache_resource
+def get_refresh_scheduler():
+    return RefreshScheduler()
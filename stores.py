@@ -0,0 +1,77 @@
+import os
+import copy
+import json
+import decimal
+import threading
+
+
+STORE_PATH = os.environ.get('SECONDFRONT_STORE_PATH', '.store')
+
+
+def _json_default(value):
+    # DynamoDB numbers arrive as Decimal
+    if isinstance(value, decimal.Decimal):
+        return int(value) if value == value.to_integral_value() else float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class JsonStore:
+    """
+    Local on-disk state, one JSON file per name under `path/directory`.
+
+    Names without a readable file load as a fresh copy of `EMPTY`.
+    """
+
+    directory = None
+    EMPTY = {}
+
+    def __init__(self, path=STORE_PATH):
+        self.path = os.path.join(path, self.directory)
+        self.lock = threading.Lock()
+
+    def _file(self, name: str):
+        return os.path.join(self.path, f"{name}.json")
+
+    def load(self, name: str):
+        try:
+            with self.lock, open(self._file(name)) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return copy.deepcopy(self.EMPTY)
+
+    def save(self, name: str, state):
+        os.makedirs(self.path, exist_ok=True)
+        tmp_file = f"{self._file(name)}.{threading.get_ident()}.tmp"
+        with self.lock:
+            with open(tmp_file, 'w') as f:
+                json.dump(state, f, default=_json_default)
+            # Atomic swap so a crash or a concurrent reader never sees half a file
+            os.replace(tmp_file, self._file(name))
+
+
+class InvoiceStore(JsonStore):
+    """
+    Local copy of Wave invoices, one file per campaign slug.
+
+    Invoices are kept as the raw GraphQL edges keyed by decoded invoice id,
+    together with the sync watermarks, so a restart resumes incremental sync
+    instead of downloading the whole campaign again.
+    """
+
+    directory = 'invoices'
+    EMPTY = {'invoices': {}, 'modified_at': None, 'full_synced_at': None}
+
+    def _file(self, slug: str):
+        return super()._file(slug.upper())
+
+
+class TrackingStore(JsonStore):
+    """
+    Local copy of donation-tracking items, one file per business.
+
+    Items are keyed by donation id, with the highest donation id seen as the
+    watermark for the next incremental read.
+    """
+
+    directory = 'tracking'
+    EMPTY = {'items': {}, 'last_donation_id': None, 'full_synced_at': None}